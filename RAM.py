@@ -1,58 +1,151 @@
 import Xlib
 import Xlib.display
-import pyautogui
+from Xlib.protocol import request as xrequest
+import mss
 import cv2
 import numpy as np
 import time
+import threading
 import traceback # Import traceback
-from PIL import Image
+from concurrent.futures import ThreadPoolExecutor
 import pytesseract
 
+# 3x3 structuring element for the morphological gradient in find_internal_containers
+KERNEL_3X3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+# Run the pixel-level stages through OpenCV's OpenCL backend (T-API) when a device is available
+USE_OPENCL = cv2.ocl.haveOpenCL()
+
+# Per-thread scratch images for find_internal_containers (one set per worker), reused while the size matches
+_scratch = threading.local()
+
+# Tesseract options for container crops: LSTM engine, assume a single uniform block of text
+TESS_CONFIG = '--oem 1 --psm 6'
+
 # --- Define your function for internal processing (same as before) ---
-def find_internal_containers(window_image_cv):
+def find_internal_containers(window_image_cv, gray=None, draw=False, scale=2):
     # (Your refined OpenCV code from the previous example goes here)
-    gray = cv2.cvtColor(window_image_cv, cv2.COLOR_BGR2GRAY)
-    edges = cv2.Canny(gray, 50, 150) # Adjust thresholds as needed
-    contours, hierarchy = cv2.findContours(edges, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
-    output_img = window_image_cv.copy()
+    if gray is None:
+        gray = _scratch.gray = cv2.cvtColor(window_image_cv, cv2.COLOR_BGR2GRAY, dst=getattr(_scratch, 'gray', None))
+    # Work on a 1/scale copy (half resolution by default); container-sized boxes easily survive the downscale
+    # Morphological gradient (dilate - erode) instead of Canny, thresholded to a binary edge map
+    if USE_OPENCL:
+        small = cv2.resize(cv2.UMat(gray), None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+        gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, KERNEL_3X3)
+        _, edges = cv2.threshold(gradient, 20, 255, cv2.THRESH_BINARY) # Adjust threshold as needed
+        edges = edges.get() # findContours runs on the CPU
+    else:
+        small = _scratch.small = cv2.resize(gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA,
+                                            dst=getattr(_scratch, 'small', None))
+        edges = _scratch.edges = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, KERNEL_3X3, dst=getattr(_scratch, 'edges', None))
+        cv2.threshold(edges, 20, 255, cv2.THRESH_BINARY, dst=edges) # In place; adjust threshold as needed
+    # RETR_LIST keeps nested contours without building the hierarchy tree (use RETR_TREE for nesting checks)
+    contours, hierarchy = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
+    output_img = window_image_cv.copy() if draw else None # Skip the full-frame copy when not annotating
     container_rects = []
+    min_area = 5000 / (scale * scale) # In downscaled pixels
     if hierarchy is not None:
         hierarchy = hierarchy[0] # Get the actual hierarchy array
-        for i, cnt in enumerate(contours):
+        # Bounding boxes of all contours in one vectorised pass (matches cv2.boundingRect)
+        starts = np.cumsum([0] + [len(cnt) for cnt in contours[:-1]])
+        points = np.concatenate(contours).reshape(-1, 2)
+        mins = np.minimum.reduceat(points, starts, axis=0)
+        maxs = np.maximum.reduceat(points, starts, axis=0)
+        widths = maxs[:, 0] - mins[:, 0] + 1
+        heights = maxs[:, 1] - mins[:, 1] + 1
+        aspect_ratios = widths / heights
+        # Contour area <= bounding box area, so the prefilter never drops a real container
+        candidates = np.flatnonzero((widths * heights > min_area) & (aspect_ratios > 0.2) & (aspect_ratios < 10.0))
+        for i in candidates:
+            cnt = contours[i]
             approx = cv2.approxPolyDP(cnt, 0.02 * cv2.arcLength(cnt, True), True)
-            if len(approx) == 4:  # Looks like a rectangle
-                x_c, y_c, w_c, h_c = cv2.boundingRect(cnt)
-                min_area = 5000
-                aspect_ratio = w_c / float(h_c) if h_c > 0 else 0
-                if cv2.contourArea(cnt) > min_area and 0.2 < aspect_ratio < 10.0:
-                    # Maybe check hierarchy[i][3] to see if it has a parent (is nested)?
+            if len(approx) == 4 and cv2.contourArea(cnt) > min_area:  # Looks like a rectangle
+                x_c, y_c = int(mins[i, 0]) * scale, int(mins[i, 1]) * scale # Back to full resolution
+                w_c, h_c = int(widths[i]) * scale, int(heights[i]) * scale
+                # Maybe check hierarchy[i][3] to see if it has a parent (is nested)?
+                container_rects.append((x_c, y_c, w_c, h_c))
+                if draw:
                     cv2.rectangle(output_img, (x_c, y_c), (x_c + w_c, y_c + h_c), (0, 255, 0), 2)
-                    container_rects.append((x_c, y_c, w_c, h_c))
                     cv2.putText(output_img, str(i), (x_c, y_c - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
     return output_img, container_rects
 
 # --- End of internal processing function ---
 
 
+def roi_may_contain_text(roi_cv, min_std=8, min_edge_pixels=20):
+    # Cheap test on a 64x64 thumbnail: flat or edge-free boxes (backgrounds, separators) hold no text
+    thumb = cv2.resize(roi_cv, (64, 64), interpolation=cv2.INTER_AREA)
+    thumb_gray = cv2.cvtColor(thumb, cv2.COLOR_BGR2GRAY)
+    if thumb_gray.std() < min_std:
+        return False
+    return cv2.countNonZero(cv2.Canny(thumb_gray, 50, 150)) >= min_edge_pixels
+
+
+def process_window(window_id, window_title, window_bgra):
+    # Runs on a worker thread: no Xlib calls here, only OpenCV and tesseract
+    window_screenshot_cv = window_bgra[..., :3]
+    window_gray = cv2.cvtColor(window_bgra, cv2.COLOR_BGRA2GRAY)
+    processed_window_img, internal_boxes = find_internal_containers(window_screenshot_cv, gray=window_gray, draw=True)
+
+    ocr_texts = []
+    for i, (x_c, y_c, w_c, h_c) in enumerate(internal_boxes):
+        # Zero-copy view of the box in the captured frame
+        roi_cv = window_screenshot_cv[y_c:y_c + h_c, x_c:x_c + w_c]
+        # Skip the tesseract launch entirely for boxes that are visibly empty
+        if not roi_may_contain_text(roi_cv):
+            ocr_texts.append(f"OCR for box {i}: ")
+            continue
+        try:
+            # pytesseract accepts numpy arrays; only the box itself is converted to RGB
+            roi = cv2.cvtColor(roi_cv, cv2.COLOR_BGR2RGB)
+            ocr_texts.append(f"OCR for box {i}: {pytesseract.image_to_string(roi, config=TESS_CONFIG).strip()}")
+        except Exception as ocr_error:
+            ocr_texts.append(f"Error in OCR for box {i}: {ocr_error}")
+
+    return window_id, window_title, processed_window_img, internal_boxes, ocr_texts
+
+
 try:
     display = Xlib.display.Display()
     root = display.screen().root
-    window_ids = root.get_full_property(display.intern_atom('_NET_CLIENT_LIST'), Xlib.X.AnyPropertyType).value
+    sct = mss.mss()
+
+    # Intern every atom once up front instead of per window
+    atom_client_list = display.intern_atom('_NET_CLIENT_LIST')
+    atom_net_wm_name = display.intern_atom('_NET_WM_NAME')
+    atom_utf8 = display.intern_atom('UTF8_STRING')
+
+    window_ids = root.get_full_property(atom_client_list, Xlib.X.AnyPropertyType).value
 
     if not window_ids:
         print("Warning: No window IDs found in _NET_CLIENT_LIST.")
 
+    # Queue the attribute, geometry, position and title requests for every window and send them in
+    # one flush; replies are collected below, so the loop pays ~1 round-trip instead of 4 per window
+    pending = []
     for window_id in window_ids:
+        attrs = xrequest.GetWindowAttributes(display=display.display, defer=True, window=window_id)
+        geom = xrequest.GetGeometry(display=display.display, defer=True, drawable=window_id)
+        coords = xrequest.TranslateCoords(display=display.display, defer=True,
+                                          src_wid=window_id, dst_wid=root.id, src_x=0, src_y=0)
+        name = xrequest.GetProperty(display=display.display, defer=True, delete=False, window=window_id,
+                                    property=atom_net_wm_name, type=atom_utf8, long_offset=0, long_length=1024)
+        pending.append((window_id, attrs, geom, coords, name))
+    display.flush()
+
+    # Xlib is not thread-safe, so window queries and screenshots stay on this thread
+    captures = []
+    for window_id, attrs, geom, coords, name in pending:
         try:
             window = display.create_resource_object('window', window_id)
-            attrs = window.get_attributes()
+            attrs.reply() # Raises the X error, if any, for this window
 
             # Check if the window is viewable before getting geometry
             if attrs.map_state != Xlib.X.IsViewable:
                 # print(f"Skipping non-viewable window ID {window_id}")
                 continue
 
-            geom = window.get_geometry()
+            geom.reply()
 
             # *** Removed the coordinate translation loop ***
             # We now assume geom.x, geom.y are usable, potentially root-relative
@@ -60,7 +153,7 @@ try:
 
             # Let's try fetching the absolute coordinates using translate_coords
             # This asks "where does the point (0,0) inside this window appear on the root window?"
-            coords = window.translate_coords(root, 0, 0)
+            coords.reply()
             x_abs = coords.x
             y_abs = coords.y
 
@@ -68,8 +161,13 @@ try:
             x, y, width, height = x_abs, y_abs, geom.width, geom.height
 
             # Fetch title safely
-            title_prop = window.get_wm_name()
-            window_title = title_prop if title_prop else "Untitled" # Use the result from get_wm_name, default to "Untitled" if empty/None
+            # Prefer the UTF-8 _NET_WM_NAME fetched in the batch, fall back to the legacy WM_NAME
+            name.reply()
+            if name.property_type == atom_utf8 and name.value and name.value[1]:
+                title_prop = name.value[1].decode('utf-8', 'replace')
+            else:
+                title_prop = window.get_wm_name()
+            window_title = title_prop if title_prop else "Untitled" # Default to "Untitled" if empty/None
             
             # Filter based on size and potentially position (e.g., ignore off-screen)
             if width > 100 and height > 100 and x >= 0 and y >= 0 : # Adjust filters as needed
@@ -79,32 +177,16 @@ try:
                 time.sleep(0.1)
 
                 # Take screenshot of the window region using absolute coords
-                # Ensure pyautogui handles potential off-by-one or boundary issues
-                region = (max(0, x), max(0, y), width, height) # Ensure non-negative coords
-                window_screenshot_pil = pyautogui.screenshot(region=region)
+                region = {"top": max(0, y), "left": max(0, x), "width": width, "height": height} # Ensure non-negative coords
+                shot = sct.grab(region)
 
-                if window_screenshot_pil is None or window_screenshot_pil.size[0] == 0 or window_screenshot_pil.size[1] == 0:
+                if shot.width == 0 or shot.height == 0:
                      print(f"  -> Failed to get valid screenshot for region {region}")
                      continue
 
-                window_screenshot_cv = cv2.cvtColor(np.array(window_screenshot_pil), cv2.COLOR_RGB2BGR)
-               # Process the individual window screenshot 
-                processed_window_img, internal_boxes = find_internal_containers(window_screenshot_cv)
- 
-
-                for i, (x_c, y_c, w_c, h_c) in enumerate(internal_boxes):
-                    try:
-                        # Crop the region from original PIL image (RGB)
-                        roi = window_screenshot_pil.crop((x_c, y_c, x_c + w_c, y_c + h_c))
-                        text = pytesseract.image_to_string(roi)
-                        print(f"OCR for box {i}: {text.strip()}")
-                    except Exception as ocr_error:
-                        print(f"Error in OCR for box {i}: {ocr_error}")
-
-
-                # Display or save the result for this window
-                cv2.imshow(f"Contents: {window_title[:50]}", processed_window_img) # Limit title length
-                cv2.imwrite(f"window_{window_id}_processed.png", processed_window_img)
+                # mss delivers BGRA; wrap it without copying
+                window_bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
+                captures.append((window_id, window_title, window_bgra))
     
         except (Xlib.error.BadWindow, Xlib.error.BadDrawable, Xlib.error.BadMatch, AttributeError, TypeError) as e:
              # Catching more potential errors during property access
@@ -114,6 +196,21 @@ try:
              print(f"--- End error for window ID {window_id} ---")
              continue # Skip windows that might have disappeared or lack properties
 
+    # Container detection and OCR release the GIL, so run them for all windows in parallel
+    if captures:
+        with ThreadPoolExecutor(max_workers=min(8, len(captures))) as executor:
+            results = list(executor.map(lambda capture: process_window(*capture), captures))
+
+        # Report and display on the main thread
+        for window_id, window_title, processed_window_img, internal_boxes, ocr_texts in results:
+            print(f"Results for window: '{window_title}' (ID: {window_id}) - {len(internal_boxes)} containers")
+            for line in ocr_texts:
+                print(line)
+
+            # Display or save the result for this window
+            cv2.imshow(f"Contents: {window_title[:50]}", processed_window_img) # Limit title length
+            cv2.imwrite(f"window_{window_id}_processed.png", processed_window_img)
+
 except Exception as e:
     print(f"An unexpected error occurred: {e}")
     traceback.print_exc()
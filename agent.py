@@ -4,39 +4,122 @@ import json
 import openai
 import numpy as np
 import cv2
+import mss
 import pyautogui
 import pytesseract
-from PIL import Image
 import logging
+import threading
 import subprocess
 import shutil
-import tempfile
-import re
+from concurrent.futures import ThreadPoolExecutor
 
 # Set up logging
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler("agent.log"), logging.StreamHandler()]
+    # Line-buffered log file: every record reaches agent.log as soon as it is written
+    handlers=[logging.StreamHandler(open("agent.log", "a", buffering=1, encoding="utf-8")), logging.StreamHandler()]
 )
 logger = logging.getLogger("DesktopAgent")
 
+# Shared tesseract options: LSTM engine only, sparse-text page segmentation.
+# PSM 11 suits a full-screen capture of scattered UI labels; PSM 6 would
+# treat the whole screen as one uniform text block.
+_TESS_CONFIG = "--oem 1 --psm 11"
+
+# xdotool types a whole string through XTest in a single call
+_XDOTOOL = shutil.which("xdotool")
+
+# Single background writer for debug images, keeps PNG encoding off the analysis path
+_disk_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-save")
+
+def _save_image(path, image, description):
+    """Write an image to disk; runs on _disk_pool."""
+    try:
+        cv2.imwrite(path, image)
+        logger.info(f"Saved {description} to {path}")
+    except Exception as e:
+        logger.error(f"Failed to save {description}: {e}")
+
+# Generic plan used when the LLM is unavailable or fails
+_FALLBACK_STEPS = ["Analyze screen", "Perform actions based on visual feedback"]
+
+def _clean_step(line):
+    """Strip whitespace and list numbering ("1. ...") from one planned step."""
+    step = line.strip()
+    if step.find(".") > 0 and step.find(" ") > 0:
+        step = step[step.find(" ")+1:]
+    return step
+
+def _texts_in_boxes(image, boxes):
+    """Run OCR once over a BGR image and return the text found inside each box.
+    
+    Tesseract reports word-level bounding boxes, so each (x, y, w, h) box
+    collects the words that lie entirely within it, in reading order.
+    """
+    if len(boxes) == 0:
+        return []
+    
+    data = pytesseract.image_to_data(
+        cv2.cvtColor(image, cv2.COLOR_BGR2RGB), config=_TESS_CONFIG, output_type=pytesseract.Output.DICT
+    )
+    keep = [i for i, word in enumerate(data["text"]) if word.strip()]
+    if not keep:
+        return [""] * len(boxes)
+    
+    words = [data["text"][i].strip() for i in keep]
+    left = np.array(data["left"])[keep]
+    top = np.array(data["top"])[keep]
+    right = left + np.array(data["width"])[keep]
+    bottom = top + np.array(data["height"])[keep]
+    
+    # (boxes x words) containment matrix
+    boxes = np.asarray(boxes).reshape(-1, 4)
+    x1 = boxes[:, 0:1]
+    y1 = boxes[:, 1:2]
+    x2 = x1 + boxes[:, 2:3]
+    y2 = y1 + boxes[:, 3:4]
+    inside = (left >= x1) & (top >= y1) & (right <= x2) & (bottom <= y2)
+    
+    return [" ".join(words[j] for j in np.flatnonzero(row)) for row in inside]
+
 class DesktopAgent:
     """Autonomous desktop agent that can perform tasks by controlling the screen."""
     
-    def __init__(self, openai_api_key=None):
+    # Seconds an analyze_screen result may be reused by back-to-back lookups
+    SCREEN_CACHE_TTL = 0.25
+    
+    def __init__(self, openai_api_key=None, debug=False):
         """Initialize the desktop agent with necessary components."""
         # Initialize OpenAI if API key is provided
         self.llm_available = False
+        self.client = None
         if openai_api_key or os.environ.get("OPENAI_API_KEY"):
-            openai.api_key = openai_api_key or os.environ.get("OPENAI_API_KEY")
+            # One client for the agent's lifetime: it keeps a pool of HTTPS connections alive
+            self.client = openai.OpenAI(api_key=openai_api_key or os.environ.get("OPENAI_API_KEY"))
             self.llm_available = True
             logger.info("LLM integration enabled")
         
+        # Debug mode saves the raw and annotated screenshots from every analysis
+        self.debug = debug or os.environ.get("AGENT_DEBUG") == "1"
+        
         # Initialize screen perception
         self.screen_width, self.screen_height = pyautogui.size()
         logger.info(f"Screen size: {self.screen_width}x{self.screen_height}")
         
+        # Persistent screen grabbers, one per thread: an mss instance only works on the thread
+        # that created it, and the agent is built on one thread but used from the UI's step worker.
+        self._local = threading.local()
+        
+        # Grayscale scratch buffer, reallocated only when the frame size changes
+        self._gray_buf = None
+        
+        # Most recent analyze_screen result; dropped whenever the agent acts on the screen
+        self._screen_cache = None
+        self._screen_cache_ts = 0
+        self._lookups = {}
+        self._lookups_screen = None
+        
         # Import UI detection functions
         try:
             from ui_detector import detect_ui_elements
@@ -44,8 +127,9 @@ class DesktopAgent:
             logger.info("Using enhanced UI element detection")
         except ImportError:
             # Fallback to the original method
-            from refined import find_internal_containers
+            from refined import find_internal_containers, annotate_containers
             self.find_internal_containers = find_internal_containers
+            self.annotate_containers = annotate_containers
             logger.info("Using legacy UI element detection")
         
         # Task state
@@ -56,36 +140,54 @@ class DesktopAgent:
         
         logger.info("Desktop Agent initialized successfully")
     
+    def _screen_grabber(self):
+        """Return this thread's mss instance, creating it on the thread's first screenshot."""
+        if not hasattr(self._local, 'sct'):
+            self._local.sct = mss.mss()
+        return self._local.sct
+    
     def take_screenshot(self, region=None):
-        """Take a screenshot of the entire screen or a specific region."""
+        """Take a screenshot of the entire screen or a specific region.
+        
+        Returns a numpy array in BGR(A) channel order, or None on failure.
+        """
         # Try Wayland-native grim first if no region is specified
         if region is None and shutil.which("grim"):
             try:
-                with tempfile.NamedTemporaryFile(suffix=".png", delete=False) as tmpfile:
-                    temp_screenshot_path = tmpfile.name
-                
-                # grim saves to a file. For full screen, just specify the path.
-                # You might need to adjust if you have multiple outputs/monitors.
+                # grim writes the PNG to stdout with "-"; decode it in memory, no temp file.
                 # By default, grim captures all outputs.
-                result = subprocess.run(["grim", temp_screenshot_path], capture_output=True, text=True, check=False)
+                result = subprocess.run(["grim", "-"], capture_output=True, check=False)
                 if result.returncode == 0:
-                    logger.info(f"Screenshot taken with grim: {temp_screenshot_path}")
-                    img = Image.open(temp_screenshot_path)
-                    os.remove(temp_screenshot_path) # Clean up temp file
-                    return img
+                    logger.info("Screenshot taken with grim")
+                    # imdecode yields BGR directly
+                    return cv2.imdecode(np.frombuffer(result.stdout, dtype=np.uint8), cv2.IMREAD_COLOR)
                 else:
-                    logger.error(f"grim failed: {result.stderr}")
+                    logger.error(f"grim failed: {result.stderr.decode(errors='replace')}")
             except Exception as e:
                 logger.error(f"Error using grim: {e}")
 
-        # Fallback to pyautogui or if a region is specified (grim needs slurp for region)
+        # Grab with mss and wrap its BGRA buffer without copying
+        try:
+            sct = self._screen_grabber()
+            if region:
+                x, y, w, h = region
+                monitor = {"top": y, "left": x, "width": w, "height": h}
+            else:
+                monitor = sct.monitors[0]
+            raw = sct.grab(monitor)
+            return np.frombuffer(raw.raw, dtype=np.uint8).reshape(raw.height, raw.width, 4)
+        except Exception as e:
+            logger.error(f"Failed to take screenshot with mss: {e}")
+
+        # Fallback to pyautogui if mss cannot reach the display
         try:
             logger.info("Attempting screenshot with pyautogui...")
             time.sleep(0.5)  # Add a delay before taking the screenshot
             if region:
-                return pyautogui.screenshot(region=region)
+                screenshot = pyautogui.screenshot(region=region)
             else:
-                return pyautogui.screenshot()
+                screenshot = pyautogui.screenshot()
+            return cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
         except Exception as e:
             logger.error(f"Failed to take screenshot with pyautogui: {e}")
             return None
@@ -102,6 +204,7 @@ class DesktopAgent:
     
     def click(self, x=None, y=None, button='left'):
         """Click at the current position or specified coordinates."""
+        self._screen_cache = None
         try:
             if x is not None and y is not None:
                 pyautogui.click(x, y, button=button)
@@ -115,10 +218,25 @@ class DesktopAgent:
             logger.error(f"Failed to click: {e}")
             return False
     
-    def type_text(self, text, interval=0.01):
-        """Type the specified text with a natural typing speed."""
+    def type_text(self, text, interval=0):
+        """Type the specified text, via xdotool when available.
+        
+        interval is the pause between characters in seconds. pyautogui sleeps
+        that long per character, so the old 0.01s default dominated the cost
+        of typing long strings.
+        """
+        self._screen_cache = None
         try:
-            pyautogui.typewrite(text, interval=interval)
+            typed = False
+            if _XDOTOOL:
+                try:
+                    delay_ms = str(int(interval * 1000))
+                    subprocess.run([_XDOTOOL, "type", "--delay", delay_ms, "--", text], check=True)
+                    typed = True
+                except subprocess.CalledProcessError as e:
+                    logger.warning(f"xdotool failed, falling back to pyautogui: {e}")
+            if not typed:
+                pyautogui.write(text, interval=interval)
             logger.info(f"Typed text: {text[:20]}{'...' if len(text) > 20 else ''}")
             return True
         except Exception as e:
@@ -127,6 +245,7 @@ class DesktopAgent:
     
     def press_key(self, key):
         """Press a single key or key combination."""
+        self._screen_cache = None
         try:
             pyautogui.press(key)
             logger.info(f"Pressed key: {key}")
@@ -137,40 +256,49 @@ class DesktopAgent:
     
     def analyze_screen(self):
         """Analyze the current screen to identify UI elements and text."""
+        if self._screen_cache is not None and time.monotonic() - self._screen_cache_ts < self.SCREEN_CACHE_TTL:
+            logger.info("Reusing recent screen analysis")
+            return self._screen_cache
+        
         screenshot = self.take_screenshot()
         if screenshot is None:
             return None
         
+        # Drop the alpha channel with a view; the frame is already in BGR order
+        screenshot_cv = screenshot[..., :3]
+        
         # Save the screenshot for debugging analysis
-        try:
-            screenshot.save("debug_screenshot_for_analysis.png")
-            logger.info("Saved screenshot for analysis to debug_screenshot_for_analysis.png")
-        except Exception as e:
-            logger.error(f"Failed to save debug screenshot: {e}")
-
-        # Convert PIL image to OpenCV format
-        screenshot_cv = cv2.cvtColor(np.array(screenshot), cv2.COLOR_RGB2BGR)
+        if self.debug:
+            # Hand the writer its own copy so the frame can be released or reused meanwhile
+            _disk_pool.submit(_save_image, "debug_screenshot_for_analysis.png", screenshot_cv.copy(), "screenshot for analysis")
+        
+        # Convert to grayscale once, straight from the captured frame, into the reused buffer
+        if self._gray_buf is None or self._gray_buf.shape != screenshot.shape[:2]:
+            self._gray_buf = np.empty(screenshot.shape[:2], dtype=np.uint8)
+        gray_code = cv2.COLOR_BGRA2GRAY if screenshot.shape[2] == 4 else cv2.COLOR_BGR2GRAY
+        cv2.cvtColor(screenshot, gray_code, dst=self._gray_buf)
         
         # Use the appropriate UI element detection method
         if hasattr(self, 'detect_ui_elements'):
             # Use the new enhanced detection
-            processed_img, containers = self.detect_ui_elements(screenshot_cv)
+            processed_img, containers = self.detect_ui_elements(screenshot_cv, gray=self._gray_buf, draw=self.debug)
         else:
             # Fallback to the original method
-            processed_img, containers = self.find_internal_containers(screenshot_cv)
+            containers = self.find_internal_containers(screenshot_cv, gray=self._gray_buf)
+            processed_img = self.annotate_containers(screenshot_cv, containers) if self.debug else None
         
         # Save the processed image with detected UI elements
-        try:
-            cv2.imwrite("debug_processed_screenshot.png", processed_img)
-            logger.info(f"Saved processed screenshot with {len(containers)} detected UI elements")
-        except Exception as e:
-            logger.error(f"Failed to save processed screenshot: {e}")
+        if self.debug:
+            # processed_img is a fresh annotated copy, nothing else touches it
+            _disk_pool.submit(_save_image, "debug_processed_screenshot.png", processed_img,
+                              f"processed screenshot with {len(containers)} detected UI elements")
         
-        # Extract text from containers
+        # Extract text from containers with a single OCR pass over the whole screen
+        texts = _texts_in_boxes(screenshot_cv, containers)
         elements = []
-        for i, (x, y, w, h) in enumerate(containers):
-            roi = screenshot.crop((x, y, x + w, y + h))
-            text = pytesseract.image_to_string(roi).strip()
+        # Plain ints for the element dicts, whichever detector produced the boxes
+        boxes = np.asarray(containers, dtype=np.int32).reshape(-1, 4).tolist()
+        for i, ((x, y, w, h), text) in enumerate(zip(boxes, texts)):
             elements.append({
                 "id": i,
                 "type": "container",
@@ -179,10 +307,12 @@ class DesktopAgent:
             })
         
         logger.info(f"Analyzed screen and found {len(elements)} UI elements")
-        return {
+        self._screen_cache = {
             "screenshot": screenshot,
             "elements": elements
         }
+        self._screen_cache_ts = time.monotonic()
+        return self._screen_cache
     
     def find_element_by_text(self, text, partial_match=True):
         """Find UI element containing the specified text."""
@@ -190,15 +320,57 @@ class DesktopAgent:
         if not screen_data:
             return None
         
+        # Lookups are memoised per screen analysis, so they expire together with the screen cache
+        if self._lookups_screen is not screen_data:
+            self._lookups = {}
+            self._lookups_screen = screen_data
+        key = (text.lower(), partial_match)
+        if key in self._lookups:
+            return self._lookups[key]
+        
+        found = None
         for element in screen_data["elements"]:
             element_text = element.get("text", "")
             if (partial_match and text.lower() in element_text.lower()) or \
                (not partial_match and text.lower() == element_text.lower()):
                 logger.info(f"Found element with text '{text}': {element}")
-                return element
+                found = element
+                break
+        else:
+            logger.info(f"No element found with text '{text}'")
+        
+        self._lookups[key] = found
+        return found
+    
+    def find_element_by_regex(self, pattern):
+        """Find the first UI element whose text matches a compiled regex.
+        
+        Returns (element, match), or (None, None) if no element matches.
+        """
+        screen_data = self.analyze_screen()
+        if not screen_data:
+            return None, None
+        
+        # Shares the per-screen memo with find_element_by_text
+        if self._lookups_screen is not screen_data:
+            self._lookups = {}
+            self._lookups_screen = screen_data
+        key = ("regex", pattern)
+        if key in self._lookups:
+            return self._lookups[key]
+        
+        found = (None, None)
+        for element in screen_data["elements"]:
+            match = pattern.search(element.get("text", ""))
+            if match:
+                logger.info(f"Found element matching '{pattern.pattern}': {element}")
+                found = (element, match)
+                break
+        else:
+            logger.info(f"No element found matching '{pattern.pattern}'")
         
-        logger.info(f"No element found with text '{text}'")
-        return None
+        self._lookups[key] = found
+        return found
     
     def click_element_with_text(self, text, partial_match=True):
         """Find and click on a UI element containing the specified text."""
@@ -211,53 +383,69 @@ class DesktopAgent:
         return False
     
     def plan_task(self, task_description):
-        """Use LLM to break down the task into actionable steps."""
+        """Use LLM to break down the task into actionable steps.
+        
+        This is a generator: the completion is streamed and each step is
+        yielded as soon as its line is complete, so execution of the first
+        step can begin while the LLM is still writing the rest.
+        """
         # Check if the task matches any direct patterns in the task interpreter
         if hasattr(self, 'interpreter') and self.interpreter:
-            for pattern, _ in self.interpreter.action_patterns:
-                if re.search(pattern, task_description, re.IGNORECASE):
-                    logger.info(f"Task '{task_description}' matches a direct pattern, executing directly")
-                    return [task_description]
+            if self.interpreter.action_regex.match(task_description):
+                logger.info(f"Task '{task_description}' matches a direct pattern, executing directly")
+                yield task_description
+                return
         
         if not self.llm_available:
             logger.warning("LLM not available for task planning. Set OPENAI_API_KEY environment variable.")
-            return ["Analyze screen", "Perform actions based on visual feedback"]
+            yield from _FALLBACK_STEPS
+            return
         
+        num_steps = 0
         try:
-            response = openai.ChatCompletion.create(
+            response = self.client.chat.completions.create(
                 model="gpt-4",
                 messages=[
                     {"role": "system", "content": "You are an AI desktop automation assistant. Break down user tasks into concrete steps that can be performed using mouse clicks, keyboard input, and screen reading."},
                     {"role": "user", "content": f"Task: {task_description}\nBreak this down into a sequence of specific steps."}
-                ]
+                ],
+                stream=True
             )
-            steps = response.choices[0].message.content.strip().split("\n")
-            # Clean up steps (remove numbering, etc.)
-            steps = [step.strip() for step in steps]
-            steps = [step[step.find(" ")+1:] if step.find(".") > 0 and step.find(" ") > 0 else step for step in steps]
-            steps = [step for step in steps if step]  # Remove empty steps
+            buffer = ""
+            for chunk in response:
+                if chunk.choices:
+                    buffer += chunk.choices[0].delta.content or ""
+                # Hand out every completed line; the unfinished tail stays in the buffer
+                while "\n" in buffer:
+                    line, buffer = buffer.split("\n", 1)
+                    step = _clean_step(line)
+                    if step:
+                        num_steps += 1
+                        yield step
+            step = _clean_step(buffer)
+            if step:
+                num_steps += 1
+                yield step
             
-            logger.info(f"Planned task with {len(steps)} steps")
-            return steps
+            logger.info(f"Planned task with {num_steps} steps")
         except Exception as e:
             logger.error(f"Failed to plan task with LLM: {e}")
-            return ["Analyze screen", "Perform actions based on visual feedback"]
+            # Steps already handed out may be executing; only fall back if nothing arrived
+            if num_steps == 0:
+                yield from _FALLBACK_STEPS
     
     def execute_task(self, task_description):
         """Execute a task by planning and executing steps."""
         logger.info(f"Starting task: {task_description}")
         self.current_task = task_description
-        self.task_status = "planning"
-        
-        # Plan task steps
-        self.task_steps = self.plan_task(task_description)
-        self.current_step_index = 0
         self.task_status = "executing"
+        self.task_steps = []
         
-        # Execute each step
-        for i, step in enumerate(self.task_steps):
+        # Execute each step as soon as the planner produces it
+        for i, step in enumerate(self.plan_task(task_description)):
+            self.task_steps.append(step)
             self.current_step_index = i
-            logger.info(f"Executing step {i+1}/{len(self.task_steps)}: {step}")
+            logger.info(f"Executing step {i+1}: {step}")
             
             # Execute step (in a real implementation, this would interpret and execute the step)
             time.sleep(1)  # Placeholder for actual execution
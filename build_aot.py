@@ -0,0 +1,25 @@
+"""Compile the ui_detector kernels ahead of time into the ui_detector_aot extension module.
+
+Run once after installing numba (and again after editing the kernels):
+
+    python build_aot.py
+
+ui_detector imports the built module when present, which skips the JIT compile
+on the first detection of every run.
+"""
+import os
+
+from numba.pycc import CC
+
+import ui_detector
+
+cc = CC('ui_detector_aot')
+cc.output_dir = os.path.dirname(os.path.abspath(__file__))
+
+# Signatures match how ui_detector calls the kernels: contiguous HSV images from
+# cv2.cvtColor and the contiguous int32 box array built in remove_overlaps
+cc.export('color_mask', 'u1[:, ::1](u1[:, :, ::1])')(ui_detector._color_mask_kernel)
+cc.export('remove_overlaps', 'i8[:](i4[:, ::1], f8)')(ui_detector._remove_overlaps_kernel)
+
+if __name__ == "__main__":
+    cc.compile()
@@ -1,10 +1,10 @@
 import os
-import sys
-import time
 import tkinter as tk
 from tkinter import scrolledtext, messagebox
 import threading
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from agent import DesktopAgent
 from task_interpreter import TaskInterpreter
 
@@ -12,24 +12,65 @@ from task_interpreter import TaskInterpreter
 logging.basicConfig(
     level=logging.INFO,
     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[logging.FileHandler("agent.log"), logging.StreamHandler()]
+    # Line-buffered log file: every record reaches agent.log as soon as it is written
+    handlers=[logging.StreamHandler(open("agent.log", "a", buffering=1, encoding="utf-8")), logging.StreamHandler()]
 )
 logger = logging.getLogger("DesktopAgentUI")
 
 class RedirectText:
-    """Redirect print statements to the Tkinter text widget."""
-    def __init__(self, text_widget):
+    """Buffered writer for the Tkinter text widget.
+    
+    Writes may come from any thread, so they are only queued here; the Tk
+    main loop drains the queue every FLUSH_INTERVAL_MS and inserts all
+    pending text in a single call. Only the last max_lines lines are kept.
+    """
+    FLUSH_INTERVAL_MS = 50
+    
+    def __init__(self, text_widget, max_lines=2000):
         self.output = text_widget
+        self.max_lines = max_lines
+        self.buf = deque()
+        self.lock = threading.Lock()
+        self.output.after(self.FLUSH_INTERVAL_MS, self._flush)
 
     def write(self, string):
-        self.output.configure(state='normal')
-        self.output.insert(tk.END, string)
-        self.output.see(tk.END)
-        self.output.configure(state='disabled')
+        with self.lock:
+            self.buf.append(string)
 
     def flush(self):
         pass
 
+    def _flush(self):
+        """Insert everything written since the last tick (runs on the Tk thread)."""
+        with self.lock:
+            chunks, self.buf = self.buf, deque()
+        if chunks:
+            self.output.configure(state='normal')
+            self.output.insert(tk.END, "".join(chunks))
+            # Trim the scrollback so Tk's per-insert cost stays bounded
+            excess = int(self.output.index('end-1c').split('.')[0]) - self.max_lines
+            if excess > 0:
+                self.output.delete('1.0', f'{excess + 1}.0')
+            self.output.see(tk.END)
+            self.output.configure(state='disabled')
+        self.output.after(self.FLUSH_INTERVAL_MS, self._flush)
+
+class ConsoleHandler(logging.Handler):
+    """Logging handler that shows records in the console widget.
+    
+    emit only queues the formatted record on the RedirectText buffer, so
+    logging from a worker thread never calls into Tk.
+    """
+    def __init__(self, console):
+        super().__init__()
+        self.console = console
+
+    def emit(self, record):
+        try:
+            self.console.write(self.format(record) + "\n")
+        except Exception:
+            self.handleError(record)
+
 class DesktopAgentUI:
     """UI for interacting with the autonomous desktop agent."""
     
@@ -43,15 +84,23 @@ class DesktopAgentUI:
         # Initialize agent in a separate thread to avoid UI freezing
         self.agent = None
         self.interpreter = None
-        self.task_thread = None
         self.is_running = False
+        # Step iterator of the current run; workers report back only while theirs is still current
+        self.task_steps = None
+        
+        # Steps run one at a time on a single long-lived worker, so per-thread resources such
+        # as the agent's screen grabber are created once and reused across steps and tasks
+        self.step_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="task-step")
         
         # Create UI components
         self._create_ui()
         
-        # Redirect stdout to text widget
+        # Route log records to the text widget; stdout is left alone so stray
+        # prints from other threads never touch Tk
         self.console_redirect = RedirectText(self.console_text)
-        sys.stdout = self.console_redirect
+        self.console_handler = ConsoleHandler(self.console_redirect)
+        self.console_handler.setFormatter(logging.Formatter('%(message)s'))
+        logging.getLogger().addHandler(self.console_handler)
         
         # Initialize agent (in separate thread to avoid blocking UI)
         threading.Thread(target=self._initialize_agent).start()
@@ -144,8 +193,8 @@ class DesktopAgentUI:
         """Initialize the desktop agent."""
         try:
             # Display a message in the console
-            print("Initializing desktop agent...")
-            print("This may take a few seconds...")
+            logger.info("Initializing desktop agent...")
+            logger.info("This may take a few seconds...")
             
             # Initialize the agent
             self.agent = DesktopAgent()
@@ -156,8 +205,8 @@ class DesktopAgentUI:
             
             # Update the status
             self.status_var.set("Agent ready")
-            print("Agent initialization complete!")
-            print("Enter a task and click 'Run Task' to begin.")
+            logger.info("Agent initialization complete!")
+            logger.info("Enter a task and click 'Run Task' to begin.")
             
             # Enable the run button
             self.run_button.config(state=tk.NORMAL)
@@ -165,7 +214,7 @@ class DesktopAgentUI:
         except Exception as e:
             error_msg = f"Error initializing agent: {str(e)}"
             self.status_var.set(error_msg)
-            print(error_msg)
+            logger.error(error_msg)
             messagebox.showerror("Initialization Error", error_msg)
     
     def _on_submit(self, event=None):
@@ -196,57 +245,77 @@ class DesktopAgentUI:
         self.stop_button.config(state=tk.NORMAL)
         self.status_var.set(f"Running task: {task}")
         
-        # Run the task in a separate thread
-        self.task_thread = threading.Thread(target=self._execute_task, args=(task,))
-        self.task_thread.daemon = True
-        self.task_thread.start()
+        logger.info(f"Starting task: {task}")
+        
+        # Plan the task; steps stream in and run while the rest are still being planned.
+        # Each step runs on the step worker and the Tk loop starts the next one as soon
+        # as it finishes, so nothing sleeps between steps.
+        logger.info("Planning task steps...")
+        logger.info("Executing task...")
+        self.task_steps = enumerate(self.agent.plan_task(task), 1)
+        self._run_next_step()
     
-    def _execute_task(self, task):
-        """Execute the task in a separate thread."""
+    def _run_next_step(self):
+        """Start the next step of the current task (runs on the Tk thread)."""
+        if not self.is_running:
+            logger.info("Task execution stopped by user.")
+            self._reset_ui_after_task()
+            return
+        
+        self.step_pool.submit(self._execute_step, self.task_steps)
+    
+    def _execute_step(self, steps):
+        """Fetch the next planned step of steps and execute it on the step worker."""
         try:
-            print(f"Starting task: {task}")
-            
-            # Plan the task
-            print("Planning task steps...")
-            steps = self.agent.plan_task(task)
-            print(f"Task broken down into {len(steps)} steps:")
-            for i, step in enumerate(steps):
-                print(f"{i+1}. {step}")
+            # Advancing the plan may wait on the LLM stream, so it happens here too
+            i, step = next(steps, (None, None))
+            if step is None:
+                self._post_result(steps, self._finish_task)
+                return
             
-            # Execute each step
-            print("\nExecuting task...")
-            for i, step in enumerate(steps):
-                if not self.is_running:
-                    print("Task execution stopped by user.")
-                    break
-                
-                print(f"\nStep {i+1}/{len(steps)}: {step}")
-                self.status_var.set(f"Executing step {i+1}/{len(steps)}")
-                
-                # Give the user a moment to read the step
-                time.sleep(1)
-                
-                # Execute the step
-                success = self.interpreter.interpret_step(step)
-                
-                if not success:
-                    print(f"Failed to execute step: {step}")
-                    if messagebox.askyesno("Step Failed", f"Step {i+1} failed. Continue with next step?"):
-                        continue
-                    else:
-                        break
+            logger.info(f"Step {i}: {step}")
+            self._post_result(steps, self.status_var.set, f"Executing step {i}")
             
-            if self.is_running:
-                print("\nTask execution completed!")
-                self.status_var.set("Task completed")
+            # Execute the step
+            success = self.interpreter.interpret_step(step)
         except Exception as e:
-            error_msg = f"Error executing task: {str(e)}"
-            print(error_msg)
-            self.status_var.set("Task failed")
-            logger.exception("Task execution error")
+            logger.exception(f"Error executing task: {str(e)}")
+            self._post_result(steps, self._fail_task)
+            return
+        
+        self._post_result(steps, self._on_step_done, i, step, success)
+    
+    def _post_result(self, steps, callback, *args):
+        """Run callback on the Tk thread, unless the run that steps belongs to has been replaced.
         
-        # Reset UI state
-        self.root.after(0, self._reset_ui_after_task)
+        A step stopped by the user keeps running until it returns; by then a new task may own
+        the UI, and the old step must not advance or reset it.
+        """
+        def deliver():
+            if steps is self.task_steps:
+                callback(*args)
+        self.root.after(0, deliver)
+    
+    def _on_step_done(self, i, step, success):
+        """Handle a finished step and move on to the next one."""
+        if not success and self.is_running:
+            logger.error(f"Failed to execute step: {step}")
+            if not messagebox.askyesno("Step Failed", f"Step {i} failed. Continue with next step?"):
+                self._finish_task()
+                return
+        self._run_next_step()
+    
+    def _finish_task(self):
+        """Wrap up after the last step (or after the user gave up on a failed one)."""
+        if self.is_running:
+            logger.info("Task execution completed!")
+            self.status_var.set("Task completed")
+        self._reset_ui_after_task()
+    
+    def _fail_task(self):
+        """Wrap up after a step raised."""
+        self.status_var.set("Task failed")
+        self._reset_ui_after_task()
     
     def _reset_ui_after_task(self):
         """Reset the UI after task completion."""
@@ -261,7 +330,7 @@ class DesktopAgentUI:
         
         self.is_running = False
         self.status_var.set("Stopping task...")
-        print("\nStopping task...")
+        logger.info("Stopping task...")
     
     def _clear_console(self):
         """Clear the console output."""
@@ -1,170 +1,407 @@
+import os
+import hashlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 import Xlib
 import Xlib.display
-import pyautogui
+from Xlib.protocol import request as xrequest
+import mss
 import cv2
 import numpy as np
 import time
+import threading
 import traceback
-from PIL import Image
 import pytesseract
 
+# 3x3 structuring element for the morphological gradient in find_internal_containers
+KERNEL_3X3 = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+
+# Run the pixel-level stages through OpenCV's OpenCL backend (T-API) when a device is available
+USE_OPENCL = cv2.ocl.haveOpenCL()
+
+# Per-thread scratch images for find_internal_containers. OpenCV writes into them in place
+# while the frame size stays the same and hands back a fresh array when it changes.
+_scratch = threading.local()
+
 # --- Define your function for internal processing ---
-def find_internal_containers(window_image_cv):
+def find_internal_containers(window_image_cv, gray=None, scale=2):
+    # Returns the (x, y, w, h) container boxes only; see annotate_containers for drawing them
     # Ensure the input image is not None
     if window_image_cv is None:
-        return None, []
-
-    gray = cv2.cvtColor(window_image_cv, cv2.COLOR_BGR2GRAY)
-    # You might need to adjust these thresholds based on image contrast
-    edges = cv2.Canny(gray, 30, 100) # Lower thresholds for more edge detection
+        return []
+
+    if gray is None:
+        gray = _scratch.gray = cv2.cvtColor(window_image_cv, cv2.COLOR_BGR2GRAY, dst=getattr(_scratch, 'gray', None))
+
+    # Work on a 1/scale copy (half resolution by default); container-sized boxes easily survive the downscale
+    if USE_OPENCL:
+        small = cv2.resize(cv2.UMat(gray), None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
+        # Morphological gradient (dilate - erode) marks boundaries in a single pass, much cheaper than Canny
+        gradient = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, KERNEL_3X3)
+        # You might need to adjust this threshold based on image contrast
+        _, edges = cv2.threshold(gradient, 20, 255, cv2.THRESH_BINARY)
+        edges = edges.get() # findContours has no OpenCL path, bring the edge map back to the CPU
+    else:
+        # Same pipeline on the CPU, reusing the scratch images and thresholding the gradient in place
+        small = _scratch.small = cv2.resize(gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA,
+                                            dst=getattr(_scratch, 'small', None))
+        edges = _scratch.edges = cv2.morphologyEx(small, cv2.MORPH_GRADIENT, KERNEL_3X3, dst=getattr(_scratch, 'edges', None))
+        cv2.threshold(edges, 20, 255, cv2.THRESH_BINARY, dst=edges)
 
-    # Use copy() to avoid modifying the original edges image in findContours
-    contours, hierarchy = cv2.findContours(edges.copy(), cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    # RETR_LIST keeps nested contours without building the full hierarchy tree
+    # (switch back to RETR_TREE to use the nesting filter below)
+    contours, hierarchy = cv2.findContours(edges, cv2.RETR_LIST, cv2.CHAIN_APPROX_SIMPLE)
 
-    output_img = window_image_cv.copy()
     container_rects = []
 
+    # Adjust these filtering criteria based on your target "containers"
+    min_area = 500 / (scale * scale) # Reduced threshold to detect smaller UI elements (in downscaled pixels)
+
     if hierarchy is not None:
         hierarchy = hierarchy[0] # Get the actual hierarchy array
-        for i, cnt in enumerate(contours):
+
+        # Bounding boxes of all contours at once (same result as cv2.boundingRect per contour)
+        lengths = [len(cnt) for cnt in contours]
+        points = np.concatenate(contours).reshape(-1, 2)
+        starts = np.cumsum([0] + lengths[:-1])
+        mins = np.minimum.reduceat(points, starts, axis=0)
+        maxs = np.maximum.reduceat(points, starts, axis=0)
+        widths = maxs[:, 0] - mins[:, 0] + 1
+        heights = maxs[:, 1] - mins[:, 1] + 1
+        aspect_ratios = widths / heights
+
+        # Prefilter on box size and shape; a contour's area never exceeds its bounding box,
+        # so this only drops contours the full check below would reject anyway
+        candidates = np.flatnonzero((widths * heights > min_area) & (aspect_ratios > 0.1) & (aspect_ratios < 15.0))
+
+        for i in candidates:
+            cnt = contours[i]
             approx = cv2.approxPolyDP(cnt, 0.02 * cv2.arcLength(cnt, True), True)
 
             # Check if the contour is approximately rectangular
-            if len(approx) == 4:
-                x_c, y_c, w_c, h_c = cv2.boundingRect(cnt)
+            # Example filters (tune these based on what you want to detect)
+            if len(approx) == 4 and cv2.contourArea(cnt) > min_area:
+                # Map the box back to full-resolution coordinates
+                x_c, y_c = int(mins[i, 0]) * scale, int(mins[i, 1]) * scale
+                w_c, h_c = int(widths[i]) * scale, int(heights[i]) * scale
 
-                # Adjust these filtering criteria based on your target "containers"
-                min_area = 500 # Reduced threshold to detect smaller UI elements
-                aspect_ratio = w_c / float(h_c) if h_c > 0 else 0
+                # Check hierarchy[i][3] to see if it has a parent (is nested)? (Optional advanced filter)
+                # if hierarchy[i][3] != -1: # Example: only detect nested contours
 
-                # Example filters (tune these based on what you want to detect)
-                if cv2.contourArea(cnt) > min_area and 0.1 < aspect_ratio < 15.0:
-                    # Check hierarchy[i][3] to see if it has a parent (is nested)? (Optional advanced filter)
-                    # if hierarchy[i][3] != -1: # Example: only detect nested contours
+                container_rects.append((x_c, y_c, w_c, h_c))
 
-                    # Draw the rectangle with a different color (Blue) and thicker line
-                    contour_color = (255, 0, 0) # Blue in BGR format
-                    line_thickness = 3 # Increased thickness
-
-                    cv2.rectangle(output_img, (x_c, y_c), (x_c + w_c, y_c + h_c), contour_color, line_thickness)
-                    container_rects.append((x_c, y_c, w_c, h_c))
-                    # Draw contour index text
-                    cv2.putText(output_img, str(i), (x_c, y_c - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, contour_color, 1)
-
-    return output_img, container_rects
+    return container_rects
 # --- End of internal processing function ---
 
 
-try:
-    display = Xlib.display.Display()
-    root = display.screen().root
-    # Use _NET_CLIENT_LIST_STACKING for potentially a more ordered list,
-    # but _NET_CLIENT_LIST is usually sufficient for iterating windows.
-    window_ids = root.get_full_property(display.intern_atom('_NET_CLIENT_LIST'), Xlib.X.AnyPropertyType)
-    if window_ids:
-        window_ids = window_ids.value
-    else:
-         window_ids = []
-         print("Warning: No window IDs found in _NET_CLIENT_LIST.")
-
-
-    for window_id in window_ids:
-        try:
-            window = display.create_resource_object('window', window_id)
-            attrs = window.get_attributes()
-
-            # Check if the window is viewable before getting geometry
-            if attrs.map_state != Xlib.X.IsViewable:
-                # print(f"Skipping non-viewable window ID {window_id}")
-                continue
-
-            # Use translate_coords for reliable absolute position
-            coords = window.translate_coords(root, 0, 0)
-            x_abs = coords.x
-            y_abs = coords.y
-
-            geom = window.get_geometry()
-
-            # Use absolute coordinates and geometry width/height
-            x, y, width, height = x_abs, y_abs, geom.width, geom.height
+def annotate_containers(window_image_cv, container_rects):
+    # Copy of the image with every container outlined and numbered; only needed for display
+    output_img = window_image_cv.copy()
 
-            # Fetch title safely (cleaned up)
+    # Draw the rectangle with a different color (Blue) and thicker line
+    contour_color = (255, 0, 0) # Blue in BGR format
+    line_thickness = 3 # Increased thickness
+
+    for i, (x_c, y_c, w_c, h_c) in enumerate(container_rects):
+        cv2.rectangle(output_img, (x_c, y_c), (x_c + w_c, y_c + h_c), contour_color, line_thickness)
+        # Draw container index text
+        cv2.putText(output_img, str(i), (x_c, y_c - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, contour_color, 1)
+
+    return output_img
+
+
+# OCR results keyed on (width, height, blake2b digest of the pixels), most recently used last.
+# Window contents rarely change between passes, so most windows are answered without tesseract.
+OCR_CACHE_SIZE = 256
+_ocr_cache = OrderedDict()
+_ocr_cache_lock = threading.Lock() # Windows are OCR'd on several threads at once
+
+def ocr_words(image_cv):
+    """Return (text, left, top, width, height) for every word in a BGR image.
+
+    Tesseract runs once over the whole image; the result is reused for identical images.
+    """
+    key = (image_cv.shape[1], image_cv.shape[0], hashlib.blake2b(image_cv.tobytes(), digest_size=8).digest())
+    with _ocr_cache_lock:
+        words = _ocr_cache.get(key)
+        if words is not None:
+            _ocr_cache.move_to_end(key)
+            return words
+    # pytesseract accepts numpy arrays, in RGB order
+    data = pytesseract.image_to_data(cv2.cvtColor(image_cv, cv2.COLOR_BGR2RGB), output_type=pytesseract.Output.DICT)
+    words = [(text.strip(), left, top, width, height)
+             for text, left, top, width, height in zip(data['text'], data['left'], data['top'], data['width'], data['height'])
+             if text.strip()]
+    with _ocr_cache_lock:
+        _ocr_cache[key] = words
+        if len(_ocr_cache) > OCR_CACHE_SIZE:
+            _ocr_cache.popitem(last=False) # Evict the least recently used image
+    return words
+
+
+# Atom ids are server-wide, so they are interned once (in main) and shared by every connection
+ATOM_NAMES = ('_NET_CLIENT_LIST', '_NET_WM_NAME', 'WM_NAME', 'UTF8_STRING', '_NET_WM_PID')
+ATOMS = {}
+
+def intern_atoms(display):
+    for name in ATOM_NAMES:
+        ATOMS[name] = display.intern_atom(name)
+
+
+# Xlib displays and mss instances are not thread-safe, so every worker thread gets its own
+_worker = threading.local()
+
+def _worker_connections():
+    if not hasattr(_worker, 'display'):
+        _worker.display = Xlib.display.Display()
+        _worker.sct = mss.mss()
+        if not ATOMS: # process_window called without main()
+            intern_atoms(_worker.display)
+    return _worker.display, _worker.sct
+
+
+def process_window(window_id):
+    """Capture one window, find its containers and OCR them. Runs on a worker thread.
+
+    Returns (window_id, window_title, window_screenshot_cv, internal_boxes, ocr_lines), or None
+    if the window is skipped or fails.
+    """
+    display, sct = _worker_connections()
+    root = display.screen().root
+    try:
+        window = display.create_resource_object('window', window_id)
+
+        # Send the attribute, position, geometry and title queries together and only then
+        # wait for the replies: one round-trip instead of four
+        attrs = xrequest.GetWindowAttributes(display=display.display, defer=True, window=window_id)
+        coords = xrequest.TranslateCoords(display=display.display, defer=True,
+                                          src_wid=window_id, dst_wid=root.id, src_x=0, src_y=0)
+        geom = xrequest.GetGeometry(display=display.display, defer=True, drawable=window_id)
+        name = xrequest.GetProperty(display=display.display, defer=True, delete=False, window=window_id,
+                                    property=ATOMS['_NET_WM_NAME'], type=ATOMS['UTF8_STRING'],
+                                    long_offset=0, long_length=1024)
+        display.flush()
+        attrs.reply() # Raises the X error, if any, for this window
+
+        # Check if the window is viewable before getting geometry
+        if attrs.map_state != Xlib.X.IsViewable:
+            # print(f"Skipping non-viewable window ID {window_id}")
+            return None
+
+        # Use translate_coords for reliable absolute position
+        coords.reply()
+        x_abs = coords.x
+        y_abs = coords.y
+
+        geom.reply()
+
+        # Use absolute coordinates and geometry width/height
+        x, y, width, height = x_abs, y_abs, geom.width, geom.height
+
+        # Fetch title safely (cleaned up)
+        # Prefer the UTF-8 _NET_WM_NAME fetched in the batch, fall back to the legacy WM_NAME
+        name.reply()
+        if name.property_type == ATOMS['UTF8_STRING'] and name.value and name.value[1]:
+            title_prop = name.value[1].decode('utf-8', 'replace')
+        else:
             title_prop = window.get_wm_name()
-            window_title = title_prop if title_prop else "Untitled"
+        window_title = title_prop if title_prop else "Untitled"
 
-            # Filter based on size and potentially position (e.g., ignore off-screen)
-            # Adjust filters as needed to include/exclude specific windows
-            if width > 100 and height > 100 and x >= 0 and y >= 0:
-                print(f"Processing window: '{window_title}' (ID: {window_id}) Geom: {x},{y} {width}x{height}")
+        # Filter based on size and potentially position (e.g., ignore off-screen)
+        # Adjust filters as needed to include/exclude specific windows
+        if not (width > 100 and height > 100 and x >= 0 and y >= 0):
+            return None
+        print(f"Processing window: '{window_title}' (ID: {window_id}) Geom: {x},{y} {width}x{height}")
 
-                # Add a small delay if screenshots are blank/incorrect on your system
-                time.sleep(0.1)
+        # Add a small delay if screenshots are blank/incorrect on your system
+        time.sleep(0.1)
 
-                # Take screenshot of the window region using absolute coords
-                # Ensure pyautogui handles potential off-by-one or boundary issues
-                region = (max(0, x), max(0, y), width, height) # Ensure non-negative coords
+        # Read the window's own pixels straight from the X server: only width*height*4 bytes
+        # cross the socket. This fails (BadMatch) for windows that are partly off-screen,
+        # and non-32bpp visuals don't fit the BGRA layout, so those fall back to a screen grab.
+        window_bgra = None
+        try:
+            raw = window.get_image(0, 0, width, height, Xlib.X.ZPixmap, 0xffffffff)
+            if len(raw.data) == width * height * 4:
+                window_bgra = np.frombuffer(raw.data, dtype=np.uint8).reshape(height, width, 4)
+        except Xlib.error.BadMatch:
+            pass
 
-                try:
-                    window_screenshot_pil = pyautogui.screenshot(region=region)
-                except Exception as screenshot_error:
-                    print(f"  -> Failed to take screenshot for region {region}: {screenshot_error}")
-                    continue
+        if window_bgra is None:
+            # Take screenshot of the window region using absolute coords
+            region = {"top": max(0, y), "left": max(0, x), "width": width, "height": height} # Ensure non-negative coords
 
+            try:
+                shot = sct.grab(region)
+            except Exception as screenshot_error:
+                print(f"  -> Failed to take screenshot for region {region}: {screenshot_error}")
+                return None
 
-                if window_screenshot_pil is None or window_screenshot_pil.size[0] == 0 or window_screenshot_pil.size[1] == 0:
-                     print(f"  -> Failed to get valid screenshot for region {region}")
-                     continue
 
-                window_screenshot_cv = cv2.cvtColor(np.array(window_screenshot_pil), cv2.COLOR_RGB2BGR)
+            if shot.width == 0 or shot.height == 0:
+                 print(f"  -> Failed to get valid screenshot for region {region}")
+                 return None
 
-               # Process the individual window screenshot
-                processed_window_img, internal_boxes = find_internal_containers(window_screenshot_cv)
+            # mss delivers BGRA; wrap it without copying
+            window_bgra = np.frombuffer(shot.raw, dtype=np.uint8).reshape(shot.height, shot.width, 4)
 
-                # Check if processed_window_img is valid before displaying/saving
-                if processed_window_img is None:
-                     print(f"  -> find_internal_containers returned None for window ID {window_id}")
-                     continue
+        # Drop alpha with a view
+        window_screenshot_cv = window_bgra[..., :3]
+        window_gray = cv2.cvtColor(window_bgra, cv2.COLOR_BGRA2GRAY)
 
-                # Perform OCR on the found internal boxes
-                for i, (x_c, y_c, w_c, h_c) in enumerate(internal_boxes):
-                    try:
-                        # Crop the region from original PIL image (RGB)
-                        # Use the coordinates relative to the window screenshot (x_c, y_c)
-                        roi = window_screenshot_pil.crop((x_c, y_c, x_c + w_c, y_c + h_c))
-                        text = pytesseract.image_to_string(roi)
-                        if text.strip(): # Only print if text is found
-                            print(f"  OCR for box {i} (relative coords {x_c},{y_c} {w_c}x{h_c}): {text.strip()}")
-                    except Exception as ocr_error:
-                        print(f"  Error in OCR for box {i}: {ocr_error}")
+        # Process the individual window screenshot
+        internal_boxes = find_internal_containers(window_screenshot_cv, gray=window_gray)
 
+        # OCR the whole window once, then give each box the words whose centre lies inside it
+        ocr_lines = []
+        try:
+            words = ocr_words(window_screenshot_cv) if internal_boxes else []
+            for i, (x_c, y_c, w_c, h_c) in enumerate(internal_boxes):
+                # Use the coordinates relative to the window screenshot (x_c, y_c)
+                text = " ".join(word for word, left, top, width, height in words
+                                if x_c <= left + width / 2 < x_c + w_c and y_c <= top + height / 2 < y_c + h_c)
+                if text: # Only report if text is found
+                    ocr_lines.append(f"  OCR for box {i} (relative coords {x_c},{y_c} {w_c}x{h_c}): {text}")
+        except Exception as ocr_error:
+            ocr_lines.append(f"  Error in OCR for window {window_id}: {ocr_error}")
+
+        return window_id, window_title, window_screenshot_cv, internal_boxes, ocr_lines
+
+    except (Xlib.error.BadWindow, Xlib.error.BadDrawable, Xlib.error.BadMatch, AttributeError, TypeError) as e:
+         # Catching potential errors during property access or window interaction
+         print(f"--- Error processing window ID {window_id} ---")
+         traceback.print_exc() # Print full error information
+         print(f"--- End error for window ID {window_id} ---")
+         return None # Skip windows that cause specific Xlib or attribute errors
+    except Exception as e:
+         # Catch any other unexpected errors during the processing of a single window
+         print(f"--- Unexpected error processing window ID {window_id} ---")
+         traceback.print_exc()
+         print(f"--- End unexpected error for window ID {window_id} ---")
+         return None
+
+
+def get_client_list(root, atom_client_list):
+    # Use _NET_CLIENT_LIST_STACKING for potentially a more ordered list,
+    # but _NET_CLIENT_LIST is usually sufficient for iterating windows.
+    window_ids = root.get_full_property(atom_client_list, Xlib.X.AnyPropertyType)
+    return set(window_ids.value) if window_ids else set()
+
+
+def owned_by_this_process(display, window_id):
+    # Our own OpenCV preview windows are client windows too; the toolkit tags them with our PID
+    try:
+        window = display.create_resource_object('window', window_id)
+        pid = window.get_full_property(ATOMS['_NET_WM_PID'], Xlib.X.AnyPropertyType)
+    except Xlib.error.BadWindow:
+        return False
+    return pid is not None and len(pid.value) > 0 and pid.value[0] == os.getpid()
+
+
+def watch_window(display, window_id):
+    # Title changes arrive as PropertyNotify, moves/resizes/maps as ConfigureNotify/MapNotify.
+    # Windows can vanish at any time, so a BadWindow here is expected and ignored.
+    window = display.create_resource_object('window', window_id)
+    window.change_attributes(event_mask=Xlib.X.PropertyChangeMask | Xlib.X.StructureNotifyMask,
+                             onerror=Xlib.error.CatchError(Xlib.error.BadWindow))
+
+
+def main():
+    # Shown OpenCV window title per X window, so stale views can be closed
+    shown = {}
+    # X ids of the preview windows this script opened, never processed themselves
+    own_windows = set()
+    in_flight = {}
+    executor = ThreadPoolExecutor(max_workers=os.cpu_count())
+    try:
+        display = Xlib.display.Display()
+        root = display.screen().root
+        intern_atoms(display)
+        atom_client_list = ATOMS['_NET_CLIENT_LIST']
+        title_atoms = {ATOMS['_NET_WM_NAME'], ATOMS['WM_NAME']}
+
+        # Subscribe before reading the list so no change can slip in between
+        root.change_attributes(event_mask=Xlib.X.PropertyChangeMask)
+        window_ids = get_client_list(root, atom_client_list)
+        if not window_ids:
+             print("Warning: No window IDs found in _NET_CLIENT_LIST.")
+        for window_id in window_ids:
+            watch_window(display, window_id)
+        display.flush()
+
+        # Capture, container detection and OCR are mostly GIL-free C code, so windows are
+        # processed in parallel; OpenCV GUI calls stay on this thread.
+        # After the first pass only windows the X server reports as changed are processed again.
+        dirty = set(window_ids)
+        print("Watching for window changes. Press any key in any OpenCV window to exit.")
+        while True:
+            # Start jobs for changed windows; one already being processed waits for the next tick
+            started = dirty - in_flight.keys()
+            for window_id in started:
+                in_flight[window_id] = executor.submit(process_window, window_id)
+            dirty -= started
+
+            # Show finished results
+            for window_id in [wid for wid, future in in_flight.items() if future.done()]:
+                result = in_flight.pop(window_id).result()
+                if result is None:
+                    continue
+                window_id, window_title, window_screenshot_cv, internal_boxes, ocr_lines = result
+                if window_id not in window_ids:
+                    continue # Closed while it was being processed
+                for line in ocr_lines:
+                    print(line)
 
                 # Display or save the result for this window
+                processed_window_img = annotate_containers(window_screenshot_cv, internal_boxes)
                 # Limit title length for display window title
                 display_title = f"Contents: {window_title[:50]}" if window_title else f"Contents: ID {window_id}"
+                if shown.get(window_id, display_title) != display_title:
+                    cv2.destroyWindow(shown[window_id]) # Title changed, retire the old view
+                shown[window_id] = display_title
                 cv2.imshow(display_title, processed_window_img)
                 cv2.imwrite(f"window_{window_id}_processed.png", processed_window_img)
 
-        except (Xlib.error.BadWindow, Xlib.error.BadDrawable, Xlib.error.BadMatch, AttributeError, TypeError) as e:
-             # Catching potential errors during property access or window interaction
-             print(f"--- Error processing window ID {window_id} ---")
-             traceback.print_exc() # Print full error information
-             print(f"--- End error for window ID {window_id} ---")
-             continue # Skip windows that cause specific Xlib or attribute errors
-        except Exception as e:
-             # Catch any other unexpected errors during the processing of a single window
-             print(f"--- Unexpected error processing window ID {window_id} ---")
-             traceback.print_exc()
-             print(f"--- End unexpected error for window ID {window_id} ---")
-             continue
-
-
-except Exception as e:
-    print(f"An unexpected error occurred during initial setup or window listing: {e}")
-    traceback.print_exc()
-    print("Ensure you are running an X11 session and have python-xlib, pyautogui, opencv-python, Pillow, and pytesseract installed.")
-
-finally:
-    # Keep windows open until a key is pressed
-    print("Press any key in any OpenCV window to exit.")
-    cv2.waitKey(0)
-    cv2.destroyAllWindows()
\ No newline at end of file
+            # Pump the OpenCV GUI; a key press ends the session
+            if cv2.waitKey(50) != -1:
+                break
+
+            # Collect the windows touched by X events since the last tick (no polling of the windows themselves)
+            while display.pending_events():
+                event = display.next_event()
+                if event.type == Xlib.X.PropertyNotify:
+                    if event.window.id == root.id and event.atom == atom_client_list:
+                        current = get_client_list(root, atom_client_list)
+                        for window_id in current - window_ids - own_windows:
+                            if owned_by_this_process(display, window_id):
+                                own_windows.add(window_id)
+                                continue
+                            watch_window(display, window_id)
+                            dirty.add(window_id)
+                        own_windows &= current
+                        current -= own_windows
+                        for window_id in window_ids - current:
+                            dirty.discard(window_id)
+                            if window_id in shown:
+                                cv2.destroyWindow(shown.pop(window_id))
+                        window_ids = current
+                    elif event.atom in title_atoms:
+                        dirty.add(event.window.id)
+                elif event.type in (Xlib.X.ConfigureNotify, Xlib.X.MapNotify):
+                    dirty.add(event.window.id)
+            dirty &= window_ids
+
+    except Exception as e:
+        print(f"An unexpected error occurred during initial setup or window listing: {e}")
+        traceback.print_exc()
+        print("Ensure you are running an X11 session and have python-xlib, mss, opencv-python, and pytesseract installed.")
+
+    finally:
+        for future in in_flight.values():
+            future.cancel() # Drop queued windows; shutdown(cancel_futures=) needs Python 3.9
+        executor.shutdown(wait=False)
+        cv2.destroyAllWindows()
+
+
+if __name__ == "__main__":
+    main()
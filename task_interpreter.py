@@ -1,11 +1,35 @@
 import re
 import time
+import bisect
+import functools
 import openai
+import shutil
 import logging
+import subprocess
 import pyautogui
 
 logger = logging.getLogger("TaskInterpreter")
 
+# First terminal emulator found on PATH, looked up once instead of probing with Popen per attempt
+_TERMINAL_CMD = next((cmd for cmd in ('gnome-terminal', 'konsole', 'xterm', 'terminator', 'alacritty')
+                      if shutil.which(cmd)), None)
+
+@functools.lru_cache(maxsize=1024)
+def _llm_translate(client, step_description):
+    """Ask the LLM to translate a step into basic operations, one per line.
+    
+    Sub-steps such as "press enter" recur across tasks, so translations are
+    cached for the life of the process; failed calls raise and are not cached.
+    """
+    response = client.chat.completions.create(
+        model="gpt-4",
+        messages=[
+            {"role": "system", "content": "You are an AI desktop automation interpreter. Translate the user's instruction into a sequence of mouse and keyboard operations."},
+            {"role": "user", "content": f"Instruction: {step_description}\nTranslate this into a sequence of basic operations (click, type, press key, etc.)."}
+        ]
+    )
+    return response.choices[0].message.content.strip()
+
 class TaskInterpreter:
     """Interprets and executes tasks described in natural language."""
     
@@ -13,50 +37,95 @@ class TaskInterpreter:
         """Initialize the task interpreter with a reference to the desktop agent."""
         self.agent = agent
         self.openai_api_key = openai_api_key
+        # Reuse a single client (and its connection pool) for every LLM call;
+        # without an explicit key, share the agent's client
+        self.client = openai.OpenAI(api_key=openai_api_key) if openai_api_key else agent.client
         
-        # Define action patterns for common operations
-        self.action_patterns = [
+        # Define action patterns for common operations, in priority order
+        action_patterns = [
             # Specific task patterns
-            (r"run\s(?:the\s)?terminal", self._run_terminal),
+            ("run_terminal", r"run\s(?:the\s)?terminal", self._run_terminal),
             
             # General action patterns
-            (r"click(?:\son)?\s(?:the\s)?(?:button\s)?['\"]?(.*?)['\"]?", self._click_element),
-            (r"type\s['\"]?(.*?)['\"]?\s(?:into|in)\s(?:the\s)?(?:field\s)?['\"]?(.*?)['\"]?", self._type_into_field),
-            (r"press\s(?:the\s)?(?:key\s)?['\"]?(.*?)['\"]?", self._press_key),
-            (r"open\s(?:the\s)?(?:app\s|application\s)?['\"]?(.*?)['\"]?", self._open_application),
-            (r"wait\s(?:for\s)?(\d+)(?:\s?seconds?)?", self._wait),
-            (r"scroll\s(up|down)(?:\sby\s(\d+))?", self._scroll),
-            (r"search\s(?:for\s)?['\"]?(.*?)['\"]?", self._search),
+            ("click", r"click(?:\son)?\s(?:the\s)?(?:button\s)?['\"]?(.*?)['\"]?", self._click_element),
+            ("type", r"type\s['\"]?(.*?)['\"]?\s(?:into|in)\s(?:the\s)?(?:field\s)?['\"]?(.*?)['\"]?", self._type_into_field),
+            ("press", r"press\s(?:the\s)?(?:key\s)?['\"]?(.*?)['\"]?", self._press_key),
+            ("open", r"open\s(?:the\s)?(?:app\s|application\s)?['\"]?(.*?)['\"]?", self._open_application),
+            ("wait", r"wait\s(?:for\s)?(\d+)(?:\s?seconds?)?", self._wait),
+            ("scroll", r"scroll\s(up|down)(?:\sby\s(\d+))?", self._scroll),
+            ("search", r"search\s(?:for\s)?['\"]?(.*?)['\"]?", self._search),
             # Add handlers for high-level steps that are commonly used in fallback planning
-            (r"analyze\s(?:the\s)?screen", self._analyze_screen),
-            (r"perform\s(?:actions|tasks)(?:\sbased\son\s(?:visual\s)?feedback)?", self._perform_actions)
+            ("analyze_screen", r"analyze\s(?:the\s)?screen", self._analyze_screen),
+            ("perform_actions", r"perform\s(?:actions|tasks)(?:\sbased\son\s(?:visual\s)?feedback)?", self._perform_actions)
         ]
+        
+        # Fold every pattern into one regex so a step is scanned by a single match call.
+        # Each alternative carries its own lazy "skip ahead" prefix and the regex is
+        # anchored with match(), so an earlier pattern that occurs anywhere in the step
+        # still wins over a later one that occurs further left - the same priority
+        # as trying the patterns one by one.
+        self.action_regex = re.compile(
+            "|".join(fr"[\s\S]*?(?P<{name}>{pattern})" for name, pattern, _ in action_patterns),
+            re.IGNORECASE
+        )
+        # The same alternatives confined to one line each, plus a catch-all for lines no
+        # pattern handles, so a multi-line LLM interpretation is dispatched with a single
+        # finditer() sweep instead of re-entering interpret_step for every line.
+        line_patterns = [(name, pattern.replace(r"\s", r"[^\S\n]")) for name, pattern, _ in action_patterns]
+        self.action_lines_regex = re.compile(
+            "|".join(fr"^[^\n]*?(?P<{name}>{pattern})[^\n]*" for name, pattern in line_patterns)
+            + r"|^[^\S\n]*(?P<unmatched>\S[^\n]*)",
+            re.IGNORECASE | re.MULTILINE
+        )
+        # name -> (handler, number of groups of its own pattern); the groups start at the
+        # named group's index in whichever combined regex produced the match
+        self._dispatch = {name: (action_func, re.compile(pattern).groups)
+                          for name, pattern, action_func in action_patterns}
+        
+        # Texts that mark an element worth clicking in _perform_actions, in priority order.
+        # Built like action_regex, so a single match() over all element texts finds the
+        # highest-priority keyword present anywhere.
+        actionable_keywords = ["submit", "ok", "yes", "continue", "next", "start", 
+                               "login", "sign in", "search", "send", "apply"]
+        self.actionable_regex = re.compile("|".join(fr"[\s\S]*?({re.escape(keyword)})" for keyword in actionable_keywords))
     
     def interpret_step(self, step_description):
         """Interpret a natural language step description and execute it."""
         logger.info(f"Interpreting step: {step_description}")
         
         # Check for matches with our action patterns
-        for pattern, action_func in self.action_patterns:
-            match = re.search(pattern, step_description, re.IGNORECASE)
-            if match:
-                logger.info(f"Matched pattern: {pattern}")
-                return action_func(*match.groups())
-        
+        match = self.action_regex.match(step_description)
+        if match:
+            return self._execute_match(match)
+        return self._interpret_unmatched(step_description)
+    
+    def _execute_match(self, match):
+        """Run the handler for a match of action_regex or action_lines_regex."""
+        name = match.lastgroup
+        logger.info(f"Matched pattern: {name}")
+        action_func, group_count = self._dispatch[name]
+        start = match.re.groupindex[name]
+        return action_func(*match.groups()[start:start + group_count])
+    
+    def _interpret_unmatched(self, step_description):
+        """Handle a step none of the action patterns matched."""
         # If no pattern matches, use LLM to interpret the step if available
         if self.agent.llm_available:
             return self._interpret_with_llm(step_description)
         
         # Fallback: Try to find any UI element that might match
         logger.warning(f"No pattern matched for step: {step_description}")
-        words = step_description.split()
-        for word in words:
-            if len(word) > 3:  # Avoid short words
-                element = self.agent.find_element_by_text(word)
-                if element:
-                    logger.info(f"Found UI element with text: {word}")
-                    x, y, w, h = element["bounds"]
-                    return self.agent.click(x + w//2, y + h//2)
+        words = dict.fromkeys(word for word in step_description.split() if len(word) > 3)  # Avoid short words
+        if words:
+            # One pass over the elements for all words; longer words are more selective,
+            # so they come first in the alternation and win within an element
+            pattern = re.compile("|".join(re.escape(word) for word in sorted(words, key=len, reverse=True)),
+                                 re.IGNORECASE)
+            element, match = self.agent.find_element_by_regex(pattern)
+            if element:
+                logger.info(f"Found UI element with text: {match.group(0)}")
+                x, y, w, h = element["bounds"]
+                return self.agent.click(x + w//2, y + h//2)
         
         logger.error(f"Could not interpret step: {step_description}")
         return False
@@ -84,8 +153,14 @@ class TaskInterpreter:
         """Open an application by name."""
         # This is platform-dependent, for Linux we'll try to use the command line
         try:
-            import subprocess
-            subprocess.Popen([app_name.lower()], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            # Resolve on PATH first: a missing app costs a stat, not a failed fork/exec
+            app_path = shutil.which(app_name.lower())
+            if not app_path:
+                logger.error(f"Failed to open application {app_name}: not found on PATH")
+                return False
+            # Nobody reads the child's output: discard it so a chatty app never blocks on a full pipe,
+            # and detach it into its own session so it outlives the agent cleanly
+            subprocess.Popen([app_path], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
             logger.info(f"Launched application: {app_name}")
             time.sleep(2)  # Wait for app to start
             return True
@@ -176,19 +251,24 @@ class TaskInterpreter:
         
         # Look for actionable elements (buttons, links, etc.)
         elements = screen_data.get("elements", [])
-        actionable_keywords = ["submit", "ok", "yes", "continue", "next", "start", 
-                              "login", "sign in", "search", "send", "apply"]
         
-        # Try to find and click on an actionable element
-        for keyword in actionable_keywords:
-            for element in elements:
-                text = element.get("text", "").lower()
-                if keyword in text:
-                    logger.info(f"Found actionable element with text containing '{keyword}'")
-                    x, y, w, h = element["bounds"]
-                    center_x = x + w // 2
-                    center_y = y + h // 2
-                    return self.agent.click(center_x, center_y)
+        # Try to find and click on an actionable element: scan all texts at once, newline-separated
+        # (no keyword contains a newline, so a match never straddles two elements)
+        texts = [element.get("text", "").lower() for element in elements]
+        starts = []
+        offset = 0
+        for text in texts:
+            starts.append(offset)
+            offset += len(text) + 1
+        match = self.actionable_regex.match("\n".join(texts))
+        if match:
+            keyword = match.group(match.lastindex)
+            element = elements[bisect.bisect_right(starts, match.start(match.lastindex)) - 1]
+            logger.info(f"Found actionable element with text containing '{keyword}'")
+            x, y, w, h = element["bounds"]
+            center_x = x + w // 2
+            center_y = y + h // 2
+            return self.agent.click(center_x, center_y)
         
         # If no actionable element found, try clicking on the first element with text
         for element in elements:
@@ -205,25 +285,20 @@ class TaskInterpreter:
     def _interpret_with_llm(self, step_description):
         """Use LLM to interpret complex steps."""
         try:
-            response = openai.ChatCompletion.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": "You are an AI desktop automation interpreter. Translate the user's instruction into a sequence of mouse and keyboard operations."},
-                    {"role": "user", "content": f"Instruction: {step_description}\nTranslate this into a sequence of basic operations (click, type, press key, etc.)."}
-                ]
-            )
-            interpretation = response.choices[0].message.content.strip()
+            # Normalise whitespace only: case matters for text that ends up being typed
+            interpretation = _llm_translate(self.client, " ".join(step_description.split()))
             logger.info(f"LLM interpretation: {interpretation}")
             
-            # Execute each sub-step from the LLM
-            steps = interpretation.split("\n")
+            # Execute each non-blank line of the interpretation as a sub-step
             success = True
-            for sub_step in steps:
-                if sub_step.strip():
-                    # Recursively interpret each sub-step
-                    sub_success = self.interpret_step(sub_step)
-                    if not sub_success:
-                        success = False
+            for match in self.action_lines_regex.finditer(interpretation):
+                logger.info(f"Interpreting sub-step: {match.group(0).strip()}")
+                if match.lastgroup == "unmatched":
+                    sub_success = self._interpret_unmatched(match.group("unmatched"))
+                else:
+                    sub_success = self._execute_match(match)
+                if not sub_success:
+                    success = False
             
             return success
         except Exception as e:
@@ -262,16 +337,12 @@ class TaskInterpreter:
         
         # Method 3: Try using subprocess to run terminal directly
         try:
-            import subprocess
-            # Try common terminal commands
-            for cmd in ['gnome-terminal', 'konsole', 'xterm', 'terminator', 'alacritty']:
-                try:
-                    subprocess.Popen([cmd], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-                    logger.info(f"Launched terminal using command: {cmd}")
-                    time.sleep(2)
-                    return True
-                except FileNotFoundError:
-                    continue
+            # Terminal emulator resolved on PATH at import time
+            if _TERMINAL_CMD:
+                subprocess.Popen([_TERMINAL_CMD], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+                logger.info(f"Launched terminal using command: {_TERMINAL_CMD}")
+                time.sleep(2)
+                return True
         except Exception as e:
             logger.error(f"Failed to launch terminal using subprocess: {e}")
         
@@ -1,57 +1,99 @@
 import cv2
 import numpy as np
 import logging
+from concurrent.futures import ThreadPoolExecutor
+
+# Numba is optional: it compiles the pairwise overlap scan in remove_overlaps and the
+# fused colour mask in detect_by_color to machine code, either on first call or ahead of
+# time with build_aot.py
+try:
+    from numba import njit
+except ImportError:
+    njit = None
 
 logger = logging.getLogger("UIDetector")
 
-def detect_ui_elements(image):
+# The detectors are independent and spend their time in OpenCV code that releases the GIL,
+# so detect_ui_elements runs the edge and text detectors on these threads while the calling
+# thread does colour detection
+_detector_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="ui-detect")
+
+def detect_ui_elements(image, gray=None, draw=False, scale=2):
     """
     Detect UI elements using multiple approaches.
     
     Args:
         image: OpenCV image in BGR format
+        gray: Optional precomputed grayscale version of image
+        draw: Whether to return an annotated copy of the image
+        scale: Downscale factor for the edge and text detectors (1 = full resolution)
         
     Returns:
-        processed_img: Image with detected elements highlighted
-        elements: List of (x, y, w, h) tuples for detected elements
+        processed_img: Image with detected elements highlighted, or None if draw is False
+        elements: (N, 4) int32 array of (x, y, w, h) rows for detected elements
     """
     if image is None:
-        return None, []
+        return None, np.empty((0, 4), dtype=np.int32)
     
-    # Make a copy of the input image for drawing
-    processed_img = image.copy()
-    all_elements = []
+    # Each colour space is converted once: HSV for the colour detector,
+    # grayscale shared by the edge and text detectors
+    if gray is None:
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
     
-    # Approach 1: Color-based segmentation for buttons and UI elements
-    color_elements = detect_by_color(image)
+    # The edge and text detectors work on a 1/scale copy (half resolution by default):
+    # element-sized boxes survive the downscale and the pipelines touch 1/scale^2 of the pixels.
+    # Colour detection stays at full resolution, where the colour ranges were tuned.
+    if scale > 1:
+        gray = cv2.resize(gray, None, fx=1 / scale, fy=1 / scale, interpolation=cv2.INTER_AREA)
     
     # Approach 2: Edge-based detection for rectangular elements
-    edge_elements = detect_by_edges(image)
+    edge_elements = _detector_pool.submit(detect_by_edges, gray, scale)
     
     # Approach 3: Text region detection
-    text_elements = detect_text_regions(image)
+    text_elements = _detector_pool.submit(detect_text_regions, gray, scale)
+    
+    # Approach 1: Color-based segmentation for buttons and UI elements, meanwhile on this thread
+    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    color_elements = detect_by_color(hsv)
     
     # Combine all detected elements
-    all_elements = color_elements + edge_elements + text_elements
+    all_elements = np.vstack((color_elements, edge_elements.result(), text_elements.result()))
     
     # Remove overlapping elements
     all_elements = remove_overlaps(all_elements)
     
-    # Draw all detected elements on the processed image
-    for i, (x, y, w, h) in enumerate(all_elements):
-        cv2.rectangle(processed_img, (x, y), (x + w, y + h), (0, 255, 0), 2)
-        cv2.putText(processed_img, str(i), (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+    # Draw all detected elements on a copy of the input image
+    processed_img = None
+    if draw:
+        processed_img = image.copy()
+        # Every box outline in one call: an (N, 4, 2) array of corners, drawn as closed polygons
+        x, y, w, h = all_elements.T
+        corners = np.stack([np.column_stack(corner) for corner in ((x, y), (x + w, y), (x + w, y + h), (x, y + h))], axis=1)
+        cv2.polylines(processed_img, corners, True, (0, 255, 0), 2)
+        for i, (x, y) in enumerate(all_elements[:, :2].tolist()):
+            cv2.putText(processed_img, str(i), (x, y - 5), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
     
     logger.info(f"Detected {len(all_elements)} UI elements")
     return processed_img, all_elements
 
-def detect_by_color(image):
-    """Detect UI elements based on color segmentation."""
-    elements = []
-    
-    # Convert to HSV for better color segmentation
-    hsv = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+def _color_mask_kernel(hsv):
+    """Union of the white, blue and gray ranges of detect_by_color, computed per pixel."""
+    rows, cols = hsv.shape[0], hsv.shape[1]
+    mask = np.empty((rows, cols), dtype=np.uint8)
+    for r in range(rows):
+        for c in range(cols):
+            h, s, v = hsv[r, c, 0], hsv[r, c, 1], hsv[r, c, 2]
+            white = s <= 30 and v >= 200
+            blue = 100 <= h <= 140 and s >= 50 and v >= 50
+            gray = s <= 30 and 100 <= v <= 190
+            mask[r, c] = 255 if (white or blue or gray) else 0
+    return mask
+
+def detect_by_color(hsv):
+    """Detect UI elements based on color segmentation of an HSV image.
     
+    Returns an (N, 4) int32 array of (x, y, w, h) rows.
+    """
     # Define color ranges for common UI elements (buttons, input fields)
     # These ranges should be adjusted based on your desktop theme
     
@@ -67,44 +109,37 @@ def detect_by_color(image):
     lower_gray = np.array([0, 0, 100])
     upper_gray = np.array([180, 30, 190])
     
-    # Create masks
-    mask_white = cv2.inRange(hsv, lower_white, upper_white)
-    mask_blue = cv2.inRange(hsv, lower_blue, upper_blue)
-    mask_gray = cv2.inRange(hsv, lower_gray, upper_gray)
-    
-    # Combine masks
-    combined_mask = cv2.bitwise_or(mask_white, mask_blue)
-    combined_mask = cv2.bitwise_or(combined_mask, mask_gray)
+    if _color_mask is not None:
+        # All three ranges in a single pass over the HSV image
+        combined_mask = _color_mask(hsv)
+    else:
+        # Create masks
+        mask_white = cv2.inRange(hsv, lower_white, upper_white)
+        mask_blue = cv2.inRange(hsv, lower_blue, upper_blue)
+        mask_gray = cv2.inRange(hsv, lower_gray, upper_gray)
+        
+        # Combine masks
+        combined_mask = cv2.bitwise_or(mask_white, mask_blue)
+        combined_mask = cv2.bitwise_or(combined_mask, mask_gray)
     
     # Find contours in the combined mask
     contours, _ = cv2.findContours(combined_mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    # Process each contour
-    for cnt in contours:
-        # Filter by area
-        area = cv2.contourArea(cnt)
-        if area < 100:  # Minimum area threshold
-            continue
-        
-        # Get bounding rectangle
-        x, y, w, h = cv2.boundingRect(cnt)
-        
-        # Filter by aspect ratio
-        aspect_ratio = w / float(h) if h > 0 else 0
-        if aspect_ratio < 0.1 or aspect_ratio > 15:
-            continue
-        
-        elements.append((x, y, w, h))
+    # Filter all bounding rectangles at once by aspect ratio, and by area: a contour's area
+    # never exceeds its bounding box, so the box area is a safe prefilter for the exact check
+    rects = _bounding_rects(contours)
+    candidates = np.flatnonzero(_aspect_ok(rects) & (_box_areas(rects) >= 100))
+    # Filter by area (minimum area threshold) on the survivors only
+    keep = [i for i in candidates if cv2.contourArea(contours[i]) >= 100]
     
-    return elements
+    return rects[keep]
 
-def detect_by_edges(image):
-    """Detect UI elements based on edge detection."""
-    elements = []
-    
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+def detect_by_edges(gray, scale=1):
+    """Detect UI elements based on edge detection in a grayscale image.
     
+    gray may be a 1/scale copy of the screen; thresholds are adjusted to match.
+    Returns an (N, 4) int32 array of (x, y, w, h) rows in full-resolution pixels.
+    """
     # Apply Gaussian blur to reduce noise
     blurred = cv2.GaussianBlur(gray, (5, 5), 0)
     
@@ -118,108 +153,158 @@ def detect_by_edges(image):
     # Find contours
     contours, _ = cv2.findContours(dilated, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    # Process each contour
-    for cnt in contours:
-        # Approximate the contour to simplify
-        epsilon = 0.02 * cv2.arcLength(cnt, True)
-        approx = cv2.approxPolyDP(cnt, epsilon, True)
-        
-        # Check if it's approximately rectangular (4 points)
-        if len(approx) >= 4 and len(approx) <= 6:
-            # Get bounding rectangle
-            x, y, w, h = cv2.boundingRect(cnt)
-            
-            # Filter by area
-            area = w * h
-            if area < 200:  # Minimum area threshold
-                continue
-            
-            # Filter by aspect ratio
-            aspect_ratio = w / float(h) if h > 0 else 0
-            if aspect_ratio < 0.1 or aspect_ratio > 15:
-                continue
-            
-            elements.append((x, y, w, h))
+    # Filter by area (minimum area threshold) and aspect ratio on all bounding rectangles at once
+    rects = _bounding_rects(contours)
+    areas = _box_areas(rects)
+    candidates = np.flatnonzero(_aspect_ok(rects) & (areas >= 200 / (scale * scale)))
     
-    return elements
-
-def detect_text_regions(image):
-    """Detect potential text regions which might be UI elements."""
-    elements = []
+    # Keep the survivors that are approximately rectangular, i.e. fill most of their bounding box
+    keep = [i for i in candidates if cv2.contourArea(contours[i]) >= 0.6 * areas[i]]
     
-    # Convert to grayscale
-    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    return rects[keep] * scale
+
+def detect_text_regions(gray, scale=1):
+    """Detect potential text regions in a grayscale image which might be UI elements.
     
+    gray may be a 1/scale copy of the screen; kernel sizes and thresholds are adjusted to match.
+    Returns an (N, 4) int32 array of (x, y, w, h) rows in full-resolution pixels.
+    """
     # Apply adaptive thresholding
     thresh = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
                                    cv2.THRESH_BINARY_INV, 11, 2)
     
-    # Create a horizontal kernel and detect horizontal lines
-    h_kernel = np.ones((1, 15), np.uint8)
-    h_dilate = cv2.dilate(thresh, h_kernel, iterations=1)
-    
-    # Create a vertical kernel and detect vertical lines
-    v_kernel = np.ones((15, 1), np.uint8)
-    v_dilate = cv2.dilate(thresh, v_kernel, iterations=1)
-    
-    # Combine horizontal and vertical lines
-    combined = cv2.bitwise_or(h_dilate, v_dilate)
+    # Dilate horizontally and vertically in one pass: dilating with a "+"-shaped kernel is
+    # the union of the 1 x reach and reach x 1 dilations
+    # Odd size keeps the anchor centred: the 7 px half-reach each way, scaled down
+    reach = 2 * max(1, round(7 / scale)) + 1
+    cross_kernel = cv2.getStructuringElement(cv2.MORPH_CROSS, (reach, reach))
+    combined = cv2.dilate(thresh, cross_kernel, iterations=1)
     
     # Find contours
     contours, _ = cv2.findContours(combined, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
     
-    # Process each contour
-    for cnt in contours:
-        # Get bounding rectangle
-        x, y, w, h = cv2.boundingRect(cnt)
-        
-        # Filter by area
-        area = w * h
-        if area < 200 or area > 50000:  # Area thresholds
-            continue
-        
-        # Filter by aspect ratio
-        aspect_ratio = w / float(h) if h > 0 else 0
-        if aspect_ratio < 0.1 or aspect_ratio > 15:
-            continue
-        
-        elements.append((x, y, w, h))
-    
-    return elements
+    # Filter by area thresholds and aspect ratio on all bounding rectangles at once
+    rects = _bounding_rects(contours)
+    areas = _box_areas(rects) * (scale * scale) # In full-resolution pixels
+    return rects[_aspect_ok(rects) & (areas >= 200) & (areas <= 50000)] * scale
 
-def remove_overlaps(elements, overlap_threshold=0.7):
-    """Remove overlapping elements."""
-    if not elements:
-        return []
-    
-    # Sort elements by area (largest first)
-    elements.sort(key=lambda elem: elem[2] * elem[3], reverse=True)
-    
-    filtered_elements = []
-    
-    for elem in elements:
-        x1, y1, w1, h1 = elem
+def _bounding_rects(contours):
+    """cv2.boundingRect of every contour as an (N, 4) int32 array, computed in one pass."""
+    if len(contours) == 0:
+        return np.empty((0, 4), dtype=np.int32)
+    points = np.concatenate(contours).reshape(-1, 2)
+    starts = np.cumsum([0] + [len(cnt) for cnt in contours[:-1]])
+    mins = np.minimum.reduceat(points, starts, axis=0)
+    maxs = np.maximum.reduceat(points, starts, axis=0)
+    return np.hstack((mins, maxs - mins + 1)).astype(np.int32)
+
+def _box_areas(rects):
+    return rects[:, 2].astype(np.int64) * rects[:, 3]
+
+def _aspect_ok(rects):
+    """Mask of boxes whose aspect ratio lies within [0.1, 15]."""
+    aspect_ratios = rects[:, 2] / rects[:, 3]
+    return (aspect_ratios >= 0.1) & (aspect_ratios <= 15)
+
+def _remove_overlaps_kernel(boxes, overlap_threshold):
+    """Indices of the boxes to keep, largest first; boxes is an (N, 4) int32 array."""
+    areas = boxes[:, 2].astype(np.int64) * boxes[:, 3]
+    # Largest first; mergesort is stable, so equal areas keep their input order
+    order = np.argsort(-areas, kind='mergesort')
+    
+    keep = np.empty(len(order), dtype=np.int64)
+    n_keep = 0
+    for i in order:
+        x1, y1, w1, h1 = boxes[i, 0], boxes[i, 1], boxes[i, 2], boxes[i, 3]
         should_add = True
         
-        for filtered_elem in filtered_elements:
-            x2, y2, w2, h2 = filtered_elem
+        for k in range(n_keep):
+            j = keep[k]
+            x2, y2, w2, h2 = boxes[j, 0], boxes[j, 1], boxes[j, 2], boxes[j, 3]
             
             # Calculate intersection area
             x_overlap = max(0, min(x1 + w1, x2 + w2) - max(x1, x2))
             y_overlap = max(0, min(y1 + h1, y2 + h2) - max(y1, y2))
             overlap_area = x_overlap * y_overlap
             
-            # Calculate areas
-            area1 = w1 * h1
-            area2 = w2 * h2
-            smaller_area = min(area1, area2)
-            
-            # Check if overlap is significant
+            # Check if overlap is significant relative to the smaller element
+            smaller_area = min(areas[i], areas[j])
             if overlap_area > 0 and overlap_area / smaller_area > overlap_threshold:
                 should_add = False
                 break
         
         if should_add:
-            filtered_elements.append(elem)
+            keep[n_keep] = i
+            n_keep += 1
+    
+    return keep[:n_keep]
+
+# Side of the square cells of the spatial hash in _remove_overlaps_grid, in pixels
+GRID_CELL = 64
+
+def _remove_overlaps_grid(boxes, overlap_threshold):
+    """Same as _remove_overlaps_kernel, but each box is only tested against the kept
+    boxes that share a grid cell with it; boxes with no cell in common cannot intersect.
+    """
+    areas = boxes[:, 2].astype(np.int64) * boxes[:, 3]
+    order = np.argsort(-areas, kind='mergesort')
+    # The few neighbours per box are cheaper to test with plain ints than with array calls
+    x1, y1, w, h = boxes.T.tolist()
+    x2 = [x + dx for x, dx in zip(x1, w)]
+    y2 = [y + dy for y, dy in zip(y1, h)]
+    areas = areas.tolist()
+    
+    grid = {}  # (cell x, cell y) -> indices of kept boxes touching that cell
+    keep = []
+    for i in order.tolist():
+        # Cells covered by the box (x2, y2 are exclusive)
+        cells = [(cx, cy)
+                 for cx in range(x1[i] // GRID_CELL, (x2[i] - 1) // GRID_CELL + 1)
+                 for cy in range(y1[i] // GRID_CELL, (y2[i] - 1) // GRID_CELL + 1)]
+        should_add = True
+        for j in {j for cell in cells for j in grid.get(cell, ())}:
+            # Calculate intersection area
+            x_overlap = min(x2[i], x2[j]) - max(x1[i], x1[j])
+            y_overlap = min(y2[i], y2[j]) - max(y1[i], y1[j])
+            # Check if overlap is significant relative to the smaller element
+            if x_overlap > 0 and y_overlap > 0 and x_overlap * y_overlap / min(areas[i], areas[j]) > overlap_threshold:
+                should_add = False
+                break
+        
+        if should_add:
+            keep.append(i)
+            for cell in cells:
+                grid.setdefault(cell, []).append(i)
+    
+    return np.array(keep, dtype=np.int64)
+
+# Kernels built ahead of time by build_aot.py load without compiling; otherwise numba
+# compiles them on first call (cached on disk), and without numba the colour mask falls
+# back to cv2.inRange and the overlap scan to the grid version
+try:
+    from ui_detector_aot import color_mask as _color_mask, remove_overlaps as _remove_overlaps_impl
+except ImportError:
+    if njit is not None:
+        # Serial on purpose: numba's parallel threading layer (TBB) can keep the process from
+        # exiting when first started off the main thread, which is where the UI runs steps
+        _color_mask = njit(cache=True)(_color_mask_kernel)
+        _remove_overlaps_impl = njit(cache=True)(_remove_overlaps_kernel)
+    else:
+        _color_mask = None
+        _remove_overlaps_impl = _remove_overlaps_grid
+
+def remove_overlaps(elements, overlap_threshold=0.7):
+    """Remove overlapping elements.
+    
+    Args:
+        elements: (N, 4) array of (x, y, w, h) boxes
+        overlap_threshold: Fraction of the smaller box that must be covered to drop it
+        
+    Returns:
+        (M, 4) int32 array of the remaining boxes, largest first
+    """
+    boxes = np.ascontiguousarray(elements, dtype=np.int32).reshape(-1, 4)
+    if len(boxes) == 0:
+        return boxes
     
-    return filtered_elements 
\ No newline at end of file
+    return boxes[_remove_overlaps_impl(boxes, overlap_threshold)]